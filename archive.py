@@ -0,0 +1,106 @@
+# backend/archive.py
+# Moves old completed tasks from `task` to `archivedtask` so the live table
+# (and its indexes) only holds the working set.
+import datetime
+import os
+import threading
+
+from sqlalchemy import delete, insert, literal
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from db import engine
+from models import ArchivedTask, Task
+import cache
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+# Tasks completed (last updated) more than this many days ago are archived.
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+ARCHIVED_COLUMNS = ["id", "user_id", "title", "description", "completed", "created_at", "updated_at", "due_date", "version"]
+
+_stop = threading.Event()
+
+
+def archive_batch(session: Session, cutoff: datetime.datetime, batch_size: int):
+    """
+    Moves up to `batch_size` tasks completed before `cutoff` in one transaction.
+    Returns (tasks selected, tasks moved); they differ when a selected task
+    was reopened before it could be moved.
+    """
+    # There is no completed_at column; complete_task bumps updated_at, so it
+    # is the time the task was last completed or edited.
+    archivable = (Task.completed == True, Task.updated_at < cutoff)
+    rows = session.exec(
+        select(Task.id, Task.user_id)
+        .where(*archivable)
+        .order_by(Task.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        return 0, 0
+    ids = [row.id for row in rows]
+    now = datetime.datetime.utcnow()
+
+    # Re-check the condition in both statements: the row lock above is a no-op
+    # on SQLite, so a task may have been reopened since the SELECT. Once the
+    # INSERT runs this transaction holds SQLite's write lock, so the DELETE
+    # sees the same rows.
+    source = select(
+        *[getattr(Task, c) for c in ARCHIVED_COLUMNS], literal(now).label("archived_at")
+    ).where(Task.id.in_(ids), *archivable)
+    moved = session.exec(insert(ArchivedTask).from_select(ARCHIVED_COLUMNS + ["archived_at"], source)).rowcount
+    session.exec(delete(Task).where(Task.id.in_(ids), *archivable))
+    session.commit()
+
+    cache.publish(*{f"tasks:{row.user_id}" for row in rows})
+    return len(ids), moved
+
+
+def archive_completed_tasks(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=older_than_days)
+    total = 0
+    while not _stop.is_set():
+        with Session(engine) as session:
+            try:
+                found, moved = archive_batch(session, cutoff, batch_size)
+            except IntegrityError as e:
+                # Another worker archived the same rows first (ids are never
+                # reused, so this is a race, not a permanent clash).
+                session.rollback()
+                print(f"Task archiving conflict, will retry: {e}")
+                break
+        if found == 0:
+            break
+        total += moved
+    if total:
+        print(f"Archived {total} completed tasks older than {older_than_days} days")
+    return total
+
+
+def _run():
+    while not _stop.is_set():
+        try:
+            archive_completed_tasks()
+        except Exception as e:
+            print(f"Task archiving failed: {e}")
+        _stop.wait(ARCHIVE_INTERVAL_SECONDS)
+
+
+def start():
+    # Cleared even when disabled, so manual archive_completed_tasks() calls
+    # work again after a restart in the same process.
+    _stop.clear()
+    if not ARCHIVE_ENABLED:
+        return
+    threading.Thread(target=_run, name="task-archiver", daemon=True).start()
+
+
+def stop():
+    _stop.set()
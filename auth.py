@@ -3,33 +3,163 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 import os
+import threading
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional, Annotated
 
-from sqlmodel import Session, select
-from db import get_session
-from models import User # Import User model
+from sqlmodel import Session, select, delete
+from sqlalchemy.exc import IntegrityError
+from db import get_session, engine
+from models import User, RevokedToken # Import User model
+import cache
 
 # --- Configuration ---
 # This should be the same secret key used by Better Auth on the frontend.
 # In a real application, this MUST be stored securely in an environment variable.
 SECRET_KEY = os.getenv("BETTER_AUTH_SECRET", "a_very_secret_key_that_should_be_changed")
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30 # Default expiry for access tokens
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15")) # Default expiry for access tokens
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
 # This scheme will look for a token in the 'Authorization: Bearer <token>' header.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Users looked up by get_current_user, keyed "user:<id>". Invalidated through
+# the cache bus whenever a worker writes to that user.
+user_cache = cache.LocalCache(maxsize=4096)
+
+# --- Revocation ---
+# jti -> expiry of every revoked, unexpired *access* token, so get_current_user
+# checks revocation with a dict lookup and no DB query. A background thread
+# keeps it in sync: it loads rows revoked since its last pass whenever a worker
+# on this host publishes "revoked" on the cache bus, which it notices from the
+# socket or the shared version stamp (no DB query while nothing is revoked, so
+# an idle Neon database can suspend). Deployments spanning several hosts set
+# REVOCATION_POLL_SECONDS to also poll the DB. Expired rows are pruned at
+# startup and during syncs at most every REVOCATION_PRUNE_SECONDS.
+REVOCATION_POLL_SECONDS = float(os.getenv("REVOCATION_POLL_SECONDS", "0"))  # 0 = off
+REVOCATION_PRUNE_SECONDS = float(os.getenv("REVOCATION_PRUNE_SECONDS", "600"))
+# How often the sync thread checks the shared stamp (an mmap read).
+_STAMP_CHECK_SECONDS = 1.0
+# Re-read this far back on each pass to cover commits that landed late.
+_SYNC_OVERLAP = timedelta(seconds=5)
+
+_revoked: dict = {}
+_revoked_synced_at: Optional[datetime] = None
+_revoked_stamp: Optional[int] = None
+_revoked_pruned_at: Optional[datetime] = None
+_revoked_lock = threading.Lock()
+_revoked_wakeup = threading.Event()
+_revoked_stop = threading.Event()
+
+def sync_revoked_tokens(prune: bool = False):
+    """
+    Loads access-token revocations added since the last pass (all of them on
+    the first pass) and optionally prunes expired ones.
+    """
+    global _revoked_synced_at, _revoked_pruned_at, _revoked_stamp
+    with _revoked_lock, Session(engine) as session:
+        # Read before querying, so a revocation published meanwhile triggers another pass.
+        _revoked_stamp = cache.version("revoked")
+        now = datetime.utcnow()
+        if prune:
+            session.exec(delete(RevokedToken).where(RevokedToken.expires_at < now))
+            session.commit()
+            for jti, expires_at in list(_revoked.items()):
+                if expires_at < now:
+                    del _revoked[jti]
+            _revoked_pruned_at = now
+        query = select(RevokedToken.jti, RevokedToken.expires_at).where(
+            RevokedToken.token_type == "access", RevokedToken.expires_at >= now
+        )
+        if _revoked_synced_at is not None:
+            query = query.where(RevokedToken.revoked_at >= _revoked_synced_at - _SYNC_OVERLAP)
+        for jti, expires_at in session.exec(query):
+            _revoked[jti] = expires_at
+        _revoked_synced_at = now
+
+def load_revoked_tokens():
+    """Initial load at startup; also prunes."""
+    sync_revoked_tokens(prune=True)
+
+def _on_cache_key(key: str):
+    if key == "revoked":
+        _revoked_wakeup.set()
+
+def _sync_loop():
+    while not _revoked_stop.is_set():
+        _revoked_wakeup.wait(_STAMP_CHECK_SECONDS)
+        _revoked_wakeup.clear()
+        if _revoked_stop.is_set():
+            return
+        polled = _revoked_synced_at is None or (
+            REVOCATION_POLL_SECONDS > 0
+            and (datetime.utcnow() - _revoked_synced_at).total_seconds() >= REVOCATION_POLL_SECONDS
+        )
+        if cache.version("revoked") == _revoked_stamp and not polled:
+            continue
+        prune = _revoked_pruned_at is None or (datetime.utcnow() - _revoked_pruned_at).total_seconds() > REVOCATION_PRUNE_SECONDS
+        try:
+            sync_revoked_tokens(prune=prune)
+        except Exception as e:
+            print(f"Revocation sync failed: {e}")
+
+def start_revocation_sync():
+    _revoked_stop.clear()
+    threading.Thread(target=_sync_loop, name="revocation-sync", daemon=True).start()
+
+def stop_revocation_sync():
+    _revoked_stop.set()
+    _revoked_wakeup.set()
+
+cache.subscribe(_on_cache_key)
+
+def is_revoked(jti: Optional[str]) -> bool:
+    """Whether an access token has been revoked. Never touches the DB."""
+    if jti is None:
+        return False
+    expires_at = _revoked.get(jti)
+    return expires_at is not None and expires_at > datetime.utcnow()
+
+def revoke_token(payload: dict) -> bool:
+    """
+    Revokes the token described by a decoded JWT payload. The INSERT on the
+    jti primary key is the claim: returns False if the token was already
+    revoked, so a refresh token can be rotated only once, even across workers.
+    """
+    jti = payload.get("jti")
+    if jti is None:
+        return False
+    token_type = payload.get("type", "access")
+    expires_at = datetime.utcfromtimestamp(payload["exp"])
+    with Session(engine) as session:
+        session.add(RevokedToken(jti=jti, token_type=token_type, expires_at=expires_at))
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return False
+    if token_type == "access":
+        _revoked[jti] = expires_at
+        cache.publish("revoked")
+    return True
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "type": "access"})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(user_id: int):
+    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode = {"sub": str(user_id), "exp": expire, "jti": uuid.uuid4().hex, "type": "refresh"}
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     session: Annotated[Session, Depends(get_session)]
@@ -49,10 +179,23 @@ async def get_current_user(
         user_id: int = int(payload.get("sub"))
         if user_id is None:
             raise credentials_exception
+        # Refresh tokens are only accepted by /auth/refresh.
+        if payload.get("type", "access") != "access":
+            raise credentials_exception
+        if is_revoked(payload.get("jti")):
+            raise credentials_exception
             
+        user = user_cache.get(f"user:{user_id}")
+        if user is not None:
+            return user
+
+        stamp = cache.version(f"user:{user_id}")
         user = session.get(User, user_id)
         if user is None:
             raise credentials_exception
+        # Detach so the cached instance is never tied to this request's session.
+        session.expunge(user)
+        user_cache.set(f"user:{user_id}", user, stamp)
         return user
         
     except (JWTError, ValueError): # Add ValueError for int conversion errors
@@ -0,0 +1,253 @@
+# backend/cache.py
+# Per-process caches kept coherent across uvicorn workers on the same host.
+#
+# Every worker binds a Unix datagram socket in CACHE_BUS_DIR. Write handlers
+# call `publish(key)`, which sends the key to every peer socket so the other
+# workers can drop their cached entries. Alongside the socket, each key hashes
+# to a slot in a small mmap'ed file of version stamps which is bumped on every
+# publish. Caches record the stamp they saw when an entry was loaded and compare
+# it on read (a single mmap read), which closes the window before a datagram
+# arrives. If the socket cannot be set up (or CACHE_INVALIDATION=version), the
+# stamp check alone keeps caches correct; stale entries are then only reclaimed
+# on read or by LRU eviction.
+#
+# A second mmap'ed file holds a wall-clock timestamp per slot, set by
+# `touch(key)`; db.py uses it so read-your-writes stickiness holds no matter
+# which worker serves the next request.
+import fcntl
+import glob
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+CACHE_BUS_DIR = os.getenv("CACHE_BUS_DIR", "/tmp/in_memory_app-bus")
+CACHE_INVALIDATION = os.getenv("CACHE_INVALIDATION", "socket")  # "socket" or "version"
+
+_SLOTS = 4096
+_SLOT = struct.Struct("Q")
+_TOUCH = struct.Struct("d")
+
+_lock = threading.Lock()
+_started = False
+_mode = "version"
+_sock: Optional[socket.socket] = None
+_sock_path: Optional[str] = None
+_stamps: Optional[mmap.mmap] = None
+_stamps_fd: Optional[int] = None
+_touched: Optional[mmap.mmap] = None
+_listeners: List[Callable[[str], None]] = []
+
+
+def _slot(key: str) -> int:
+    return (zlib.crc32(key.encode()) % _SLOTS) * _SLOT.size
+
+
+def _map(name: str):
+    os.makedirs(CACHE_BUS_DIR, exist_ok=True)
+    fd = os.open(os.path.join(CACHE_BUS_DIR, name), os.O_RDWR | os.O_CREAT, 0o600)
+    fcntl.flock(fd, fcntl.LOCK_EX)
+    try:
+        if os.fstat(fd).st_size < _SLOTS * _SLOT.size:
+            os.ftruncate(fd, _SLOTS * _SLOT.size)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    return fd, mmap.mmap(fd, _SLOTS * _SLOT.size)
+
+
+def _open_stamps():
+    global _stamps, _stamps_fd, _touched
+    _stamps_fd, _stamps = _map("versions.bin")
+    touched_fd, _touched = _map("touched.bin")
+    # The mapping stays valid after the descriptor is closed.
+    os.close(touched_fd)
+
+
+def _listen():
+    while True:
+        try:
+            data = _sock.recv(4096)
+        except OSError:
+            return
+        for key in data.decode().split("\n"):
+            if key:
+                _dispatch(key)
+
+
+def _dispatch(key: str):
+    for listener in list(_listeners):
+        listener(key)
+
+
+def start():
+    """
+    Opens the shared version stamps and binds this worker's socket.
+    Safe to call more than once; called from the app's startup hook.
+    """
+    global _started, _mode, _sock, _sock_path
+    with _lock:
+        if _started:
+            return
+        _open_stamps()
+        _started = True
+        if CACHE_INVALIDATION != "socket":
+            return
+        try:
+            path = os.path.join(CACHE_BUS_DIR, f"{os.getpid()}.sock")
+            if os.path.exists(path):
+                os.unlink(path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.bind(path)
+        except OSError as e:
+            print(f"Cache bus unavailable, using version stamps only: {e}")
+            return
+        _sock, _sock_path, _mode = sock, path, "socket"
+        threading.Thread(target=_listen, name="cache-bus", daemon=True).start()
+
+
+def stop():
+    global _started, _sock, _sock_path, _mode
+    with _lock:
+        if _sock is not None:
+            _sock.close()
+            if _sock_path and os.path.exists(_sock_path):
+                os.unlink(_sock_path)
+        _sock, _sock_path, _mode, _started = None, None, "version", False
+
+
+def mode() -> str:
+    return _mode
+
+
+def version(key: str) -> int:
+    if _stamps is None:
+        start()
+    return _SLOT.unpack_from(_stamps, _slot(key))[0]
+
+
+def publish(*keys: str):
+    """
+    Invalidates `keys` in every worker on this host, including this one.
+    Call after the write has been committed.
+    """
+    if not keys:
+        return
+    if _stamps is None:
+        start()
+    fcntl.flock(_stamps_fd, fcntl.LOCK_EX)
+    try:
+        for key in keys:
+            offset = _slot(key)
+            _SLOT.pack_into(_stamps, offset, _SLOT.unpack_from(_stamps, offset)[0] + 1)
+    finally:
+        fcntl.flock(_stamps_fd, fcntl.LOCK_UN)
+
+    for key in keys:
+        _dispatch(key)
+    if _sock is None:
+        return
+    payload = "\n".join(keys).encode()
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        for path in glob.glob(os.path.join(CACHE_BUS_DIR, "*.sock")):
+            if path == _sock_path:
+                continue
+            try:
+                sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker behind this socket is gone; clean up after it.
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError:
+                # Peer's buffer is full; it will still see the bumped stamp.
+                pass
+    finally:
+        sender.close()
+
+
+def touch(key: str):
+    """Records the current time for `key`, visible to every worker on this host."""
+    if _touched is None:
+        start()
+    _TOUCH.pack_into(_touched, _slot(key), time.time())
+
+
+def touched_at(key: str) -> float:
+    """
+    When `key` was last touched (0 if never). Keys sharing a slot share a
+    timestamp, so this can only err towards "more recently".
+    """
+    if _touched is None:
+        start()
+    return _TOUCH.unpack_from(_touched, _slot(key))[0]
+
+
+def subscribe(listener: Callable[[str], None]):
+    _listeners.append(listener)
+
+
+class LocalCache:
+    """
+    A small LRU cache whose keys are invalidation keys (e.g. "user:1").
+    Entries are dropped when the key is published by any worker.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        subscribe(self.invalidate)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, stamp, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                return None
+            if stamp != version(key):
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, stamp: int):
+        """
+        Stores `value` if `key` has not been published since `stamp` was read,
+        so a load that raced with a write never caches the stale result.
+        """
+        if stamp != version(key):
+            return
+        with self._lock:
+            self._data[key] = (value, stamp, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key: str, loader: Callable[[], object]):
+        value = self.get(key)
+        if value is not None:
+            return value
+        stamp = version(key)
+        value = loader()
+        if value is not None:
+            self.set(key, value, stamp)
+        return value
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -1,20 +1,192 @@
 from sqlmodel import create_engine, Session, SQLModel
+from sqlalchemy import inspect, text
+from fastapi import Request
+from jose import jwt
 import os
+import sqlite3
+import threading
+import time
+import cache
 from models import Task, User  # Import all models
 
 # Use a local SQLite database for development if DATABASE_URL is not set.
 # The official database is Neon Serverless PostgreSQL.
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///database.db")
 
-# The connect_args are only for SQLite.
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+# Optional read replica (e.g. a Neon read replica). Defaults to the primary.
+# For local testing, point it at a second SQLite file; it is then refreshed
+# from the primary every REPLICA_SYNC_SECONDS (see start_replica_sync).
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", DATABASE_URL)
+REPLICA_SYNC_SECONDS = float(os.getenv("REPLICA_SYNC_SECONDS", "1"))
 
-engine = create_engine(DATABASE_URL, echo=True, connect_args=connect_args)
+# How long a user's reads stay on the primary after they write, so they
+# always see their own changes despite replica lag.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
 
-def get_session():
+def _connect_args(url: str) -> dict:
+    # The connect_args are only for SQLite.
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+engine = create_engine(DATABASE_URL, echo=True, connect_args=_connect_args(DATABASE_URL))
+
+if READ_DATABASE_URL == DATABASE_URL:
+    read_engine = engine
+else:
+    read_engine = create_engine(READ_DATABASE_URL, echo=True, connect_args=_connect_args(READ_DATABASE_URL))
+
+def _request_user_key(request: Request):
+    """
+    Returns the token subject for routing purposes only. The token is not
+    verified here; get_current_user does that for the actual request.
+    """
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.get_unverified_claims(authorization[7:]).get("sub")
+    except Exception:
+        return None
+
+# The time of a user's last write is kept in the cache bus's shared timestamp
+# file, so every worker on the host routes their next read to the primary.
+def mark_write(user_key):
+    if user_key is None:
+        return
+    cache.touch(f"wrote:{user_key}")
+
+def wrote_recently(user_key) -> bool:
+    if user_key is None:
+        return False
+    return time.time() - cache.touched_at(f"wrote:{user_key}") <= READ_YOUR_WRITES_SECONDS
+
+def get_read_session():
+    with Session(read_engine) as session:
+        yield session
+
+def get_write_session():
     with Session(engine) as session:
         yield session
 
+def read_only(endpoint):
+    """
+    Marks a non-GET endpoint (e.g. a POST that only looks things up) as a
+    read, so get_session routes it like a GET.
+    """
+    endpoint.read_only = True
+    return endpoint
+
+def _is_read(request: Request) -> bool:
+    if request.method in ("GET", "HEAD"):
+        return True
+    return getattr(request.scope.get("endpoint"), "read_only", False)
+
+def get_session(request: Request):
+    """
+    Routes GET/HEAD requests to the read engine and everything else to the
+    primary. A user who wrote within READ_YOUR_WRITES_SECONDS keeps reading
+    from the primary.
+    """
+    if read_engine is engine:
+        with Session(engine) as session:
+            yield session
+        return
+
+    user_key = _request_user_key(request)
+    is_write = not _is_read(request)
+    if not is_write and not wrote_recently(user_key):
+        with Session(read_engine) as session:
+            yield session
+        return
+
+    if is_write:
+        mark_write(user_key)
+    with Session(engine) as session:
+        yield session
+    if is_write:
+        # Restart the window from when the write actually finished.
+        mark_write(user_key)
+
+# Columns added to existing tables after they were first created. create_all
+# does not alter tables, so these are added on startup when missing.
+ADDED_COLUMNS = [
+    ("task", "version", "INTEGER NOT NULL DEFAULT 1"),
+]
+
+def add_missing_columns(bind):
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table, column, ddl in ADDED_COLUMNS:
+            if not inspector.has_table(table):
+                continue
+            if column not in {c["name"] for c in inspector.get_columns(table)}:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def ensure_task_autoincrement(bind):
+    """
+    Rebuilds a SQLite `task` table created before it used AUTOINCREMENT, and
+    starts its sequence above every id already used by task or archivedtask.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        sql = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type='table' AND name='task'").scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            return
+        columns = ", ".join(c.name for c in Task.__table__.columns)
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_task_user_id")
+        conn.exec_driver_sql("ALTER TABLE task RENAME TO task_old")
+        Task.__table__.create(conn)
+        conn.exec_driver_sql(f"INSERT INTO task ({columns}) SELECT {columns} FROM task_old")
+        conn.exec_driver_sql("DROP TABLE task_old")
+        highest = conn.exec_driver_sql(
+            "SELECT MAX(id) FROM (SELECT id FROM task UNION ALL SELECT id FROM archivedtask)"
+        ).scalar() or 0
+        conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'task'")
+        conn.exec_driver_sql(f"INSERT INTO sqlite_sequence (name, seq) VALUES ('task', {int(highest)})")
+
+def upgrade_schema(bind):
+    """Creates missing tables and applies the in-place upgrades above."""
+    SQLModel.metadata.create_all(bind)
+    add_missing_columns(bind)
+    ensure_task_autoincrement(bind)
+
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    upgrade_schema(engine)
+    # A real replica receives the schema from the primary; a local SQLite
+    # stand-in needs it created.
+    if read_engine is not engine and READ_DATABASE_URL.startswith("sqlite"):
+        upgrade_schema(read_engine)
+
+_replica_stop = threading.Event()
+
+def sync_sqlite_replica():
+    """Copies the primary SQLite file onto the local replica file."""
+    source = engine.raw_connection()
+    target = read_engine.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        target.close()
+        source.close()
+
+def _replicate():
+    while not _replica_stop.wait(REPLICA_SYNC_SECONDS):
+        try:
+            sync_sqlite_replica()
+        except sqlite3.Error as e:
+            print(f"Replica sync failed: {e}")
+
+def start_replica_sync():
+    """
+    Stands in for replication when the replica is a second SQLite file. Lag
+    is up to REPLICA_SYNC_SECONDS, which read-your-writes routing covers with
+    the default settings. Real replicas (e.g. Neon) replicate themselves.
+    """
+    if read_engine is engine or not READ_DATABASE_URL.startswith("sqlite"):
+        return
+    sync_sqlite_replica()
+    _replica_stop.clear()
+    threading.Thread(target=_replicate, name="replica-sync", daemon=True).start()
 
+def stop_replica_sync():
+    _replica_stop.set()
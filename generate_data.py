@@ -0,0 +1,180 @@
+# backend/generate_data.py
+# Synthetic users and tasks for benchmarking, bulk-loaded straight into the
+# models.py schema (bypassing the API).
+#
+#   python generate_data.py --users 20000 --tasks 2000000 --seed 42
+#   python generate_data.py --database-url postgresql://localhost/bench ...
+#
+# The target is bench.db unless --database-url is given; DATABASE_URL is
+# ignored so the load never hits the app's own database by accident.
+# Tasks per user follow a Pareto distribution (a few heavy users, many light
+# ones). Rows are inserted with batched executemany; the task and user indexes
+# are dropped for the load and rebuilt at the end. The same seed always
+# produces the same users and tasks (only the bcrypt salt differs).
+import argparse
+import datetime
+import random
+import time
+
+from passlib.context import CryptContext
+from sqlalchemy import func, insert, select
+from sqlmodel import create_engine
+
+from db import upgrade_schema
+from models import Task, User
+
+WORDS = (
+    "review update draft send call plan book fix write prepare check clean "
+    "order pay schedule email report meeting budget invoice design deploy test "
+    "refactor groceries dentist gym project client docs release notes slides "
+    "backup migrate renew insurance taxes travel tickets birthday gift garden"
+).split()
+
+# Every generated user can log in with this password.
+DEFAULT_PASSWORD = "password"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a synthetic users/tasks dataset.")
+    # Deliberately not DATABASE_URL: the load drops indexes and inserts
+    # millions of fake rows, so it must never land in a real database by default.
+    parser.add_argument("--database-url", default="sqlite:///bench.db",
+                        help="target database (default: a separate local sqlite:///bench.db)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tasks", type=int, default=None, help="total tasks (default: 50 per user)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skew", type=float, default=1.2, help="Pareto shape for tasks per user; lower is more skewed")
+    parser.add_argument("--completed-ratio", type=float, default=0.6)
+    parser.add_argument("--due-date-ratio", type=float, default=0.7)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--keep-indexes", action="store_true", help="insert with indexes in place")
+    return parser.parse_args()
+
+
+def tasks_per_user(rng: random.Random, users: int, total: int, skew: float):
+    weights = [rng.paretovariate(skew) for _ in range(users)]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    # Hand out the rounding remainder so the total is exact.
+    for i in rng.sample(range(users), total - sum(counts)):
+        counts[i] += 1
+    return counts
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def generate_tasks(rng: random.Random, args, user_ids, counts, now: datetime.datetime):
+    two_years = 2 * 365 * 24 * 3600
+    for user_id, count in zip(user_ids, counts):
+        for _ in range(count):
+            created_at = now - datetime.timedelta(seconds=rng.randrange(two_years))
+            completed = rng.random() < args.completed_ratio
+            updated_at = created_at
+            if completed:
+                updated_at = min(now, created_at + datetime.timedelta(hours=rng.expovariate(1 / 72)))
+            due_date = None
+            if rng.random() < args.due_date_ratio:
+                due_date = created_at + datetime.timedelta(days=rng.randint(-2, 60))
+            # Most descriptions are short, a few are long, some are missing.
+            description = None
+            if rng.random() < 0.75:
+                description = sentence(rng, min(150, max(1, int(rng.lognormvariate(2.0, 0.9)))))
+            yield {
+                "user_id": user_id,
+                "title": sentence(rng, rng.randint(1, 6)),
+                "description": description,
+                "completed": completed,
+                "created_at": created_at,
+                "updated_at": updated_at,
+                "due_date": due_date,
+                "version": 1,
+            }
+
+
+def load(conn, table, rows, batch_size: int) -> int:
+    batch, loaded = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(insert(table), batch)
+            loaded += len(batch)
+            batch = []
+    if batch:
+        conn.execute(insert(table), batch)
+        loaded += len(batch)
+    return loaded
+
+
+def load_users(conn, rows, batch_size: int):
+    """
+    Inserts users and returns their ids. Ids are assigned by the database
+    (RETURNING), so Postgres sequences stay in step for later signups.
+    """
+    table = User.__table__
+    statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+    ids, batch = [], []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            ids.extend(conn.execute(statement, batch).scalars())
+            batch = []
+    if batch:
+        ids.extend(conn.execute(statement, batch).scalars())
+    return ids
+
+
+def main():
+    args = parse_args()
+    total_tasks = args.tasks if args.tasks is not None else args.users * 50
+    rng = random.Random(args.seed)
+    now = datetime.datetime(2026, 1, 1)  # fixed, so runs are reproducible
+
+    engine = create_engine(args.database_url)
+    upgrade_schema(engine)
+    tables = [User.__table__, Task.__table__]
+    indexes = [index for table in tables for index in table.indexes]
+
+    started = time.perf_counter()
+    if not args.keep_indexes:
+        with engine.begin() as conn:
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+    try:
+        with engine.begin() as conn:
+            if conn.dialect.name == "sqlite":
+                # Only for the duration of the load; a crash may corrupt the file.
+                conn.exec_driver_sql("PRAGMA synchronous=OFF")
+                conn.exec_driver_sql("PRAGMA journal_mode=MEMORY")
+
+            # Only used to name the generated accounts uniquely.
+            first = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+            hashed_password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(DEFAULT_PASSWORD)
+            users = (
+                {"email": f"user{first + i}@example.com", "hashed_password": hashed_password,
+                 "created_at": now, "updated_at": now}
+                for i in range(args.users)
+            )
+            user_ids = load_users(conn, users, args.batch_size)
+
+            counts = tasks_per_user(rng, args.users, total_tasks, args.skew)
+            loaded_tasks = load(conn, Task.__table__, generate_tasks(rng, args, user_ids, counts, now), args.batch_size)
+        load_seconds = time.perf_counter() - started
+    finally:
+        # Rebuild even if the load failed; the unique email index must not
+        # stay dropped.
+        if not args.keep_indexes:
+            with engine.begin() as conn:
+                for index in indexes:
+                    index.create(conn, checkfirst=True)
+    elapsed = time.perf_counter() - started
+
+    counts.sort(reverse=True)
+    print(f"Loaded {len(user_ids)} users and {loaded_tasks} tasks in {load_seconds:.1f}s "
+          f"({loaded_tasks / max(load_seconds, 1e-9):,.0f} tasks/s); indexes built, total {elapsed:.1f}s")
+    print(f"Tasks per user: max {counts[0]}, median {counts[len(counts) // 2]}, min {counts[-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# backend/group_commit.py
+# Optional group commit for task mutations (GROUP_COMMIT=true).
+#
+# Instead of each request committing its own transaction, mutations are queued
+# to a single writer thread which runs every operation that arrives within
+# GROUP_COMMIT_WINDOW_MS (up to GROUP_COMMIT_MAX_BATCH) in one transaction and
+# commits once. Each caller blocks until the commit covering its operation has
+# finished, then gets its own result or exception.
+#
+# An operation is a function taking a Session. It must not commit or roll back,
+# and it may only raise HTTPException before it has written anything, so a
+# rejected request leaves the shared transaction untouched. Any other error
+# rolls the batch back and its operations are retried one transaction each.
+#
+# Each operation and its flush run in a copy of the submitting request's
+# context, so context variables such as the profiling report still see them.
+# The shared commit is not attributed to any one request.
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from db import engine
+
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT", "false").lower() == "true"
+GROUP_COMMIT_WINDOW_MS = float(os.getenv("GROUP_COMMIT_WINDOW_MS", "5"))
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+
+Operation = Callable[[Session], object]
+Item = Tuple[Operation, contextvars.Context, Future]
+
+
+class GroupCommitter:
+    def __init__(self, bind=engine, window_ms: float = GROUP_COMMIT_WINDOW_MS,
+                 max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.bind = bind
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue: "queue.Queue[Optional[Item]]" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def submit(self, op: Operation):
+        """
+        Queues `op` and waits until it has been committed. Returns its result
+        or raises its exception.
+        """
+        self.start()
+        future: Future = Future()
+        self.queue.put((op, contextvars.copy_context(), future))
+        return future.result()
+
+    def _next_batch(self) -> Optional[List[Item]]:
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop.
+                self.queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._commit_batch(batch)
+            except Exception:
+                # Something other than a rejected request failed; isolate it.
+                for item in batch:
+                    if not item[2].done():
+                        self._commit_batch([item])
+
+    def _commit_batch(self, batch: List[Item]):
+        """
+        Runs `batch` in one transaction. HTTPExceptions are delivered to their
+        own caller; any other error rolls back and propagates.
+        """
+        done = []
+        with Session(self.bind, expire_on_commit=False) as session:
+            try:
+                for op, context, future in batch:
+                    try:
+                        result = context.run(self._apply, op, session)
+                    except HTTPException as e:
+                        future.set_exception(e)
+                        continue
+                    done.append((future, result))
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                if len(batch) == 1:
+                    batch[0][2].set_exception(e)
+                    return
+                raise
+        for future, result in done:
+            future.set_result(result)
+
+    @staticmethod
+    def _apply(op: Operation, session: Session):
+        result = op(session)
+        session.flush()
+        # Detach what this operation loaded, so a later operation on the same
+        # row gets its own instance instead of refreshing this caller's result.
+        session.expunge_all()
+        return result
+
+
+committer = GroupCommitter()
+
+
+def enabled() -> bool:
+    return GROUP_COMMIT_ENABLED
+
+
+def start():
+    if GROUP_COMMIT_ENABLED:
+        committer.start()
+
+
+def stop():
+    committer.stop()
@@ -0,0 +1,292 @@
+# backend/idempotency.py
+# Idempotency-Key support for task mutations.
+#
+# The first response for a (user, key) pair is stored in an IdempotencyRecord
+# row and in an in-memory LRU in front of it. Retries get the stored response
+# without running the handler again. A duplicate that arrives while the first
+# request is still running waits for it: on an asyncio.Event in the same
+# worker, or by polling the pending row when another worker owns it.
+#
+# A hash of the request body is stored with the response; a retry whose body
+# hashes differently is rejected with 422 instead of getting a response meant
+# for another request. The body is hashed as it streams through, so large
+# /import uploads are never buffered.
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError, jwt
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, delete
+
+from auth import SECRET_KEY, ALGORITHM
+from db import engine
+from models import IdempotencyRecord
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+# How long a duplicate waits for an in-flight request in another worker.
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+IDEMPOTENT_PATH_PREFIX = "/api/tasks"
+
+_PRUNE_INTERVAL_SECONDS = 60
+# Response headers not stored for replay: recomputed by respond() or per-response.
+_UNSTORED_HEADERS = {"content-length", "content-type", "date", "server"}
+
+
+class StoredResponse:
+    __slots__ = ("method", "path", "request_hash", "status_code", "content_type", "headers", "body", "expires_at")
+
+    def __init__(self, method, path, request_hash, status_code, content_type, headers, body, expires_at):
+        self.method = method
+        self.path = path
+        self.request_hash = request_hash
+        self.status_code = status_code
+        self.content_type = content_type
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_record(cls, record: IdempotencyRecord):
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(record.headers or "[]")]
+        return cls(record.method, record.path, record.request_hash, record.status_code, record.content_type,
+                   headers, (record.body or "").encode(), record.expires_at)
+
+
+class _LRU:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.data: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        with self.lock:
+            stored = self.data.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at < datetime.datetime.utcnow():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return stored
+
+    def set(self, key: str, stored: StoredResponse):
+        with self.lock:
+            self.data[key] = stored
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+
+_responses = _LRU(IDEMPOTENCY_CACHE_SIZE)
+_in_flight: dict = {}  # record key -> asyncio.Event, for this worker
+_last_prune = 0.0
+
+
+def _claim(record_key: str, method: str, path: str):
+    """
+    Inserts a pending row for `record_key`. Returns None if this request now
+    owns the key, otherwise the existing row.
+    """
+    global _last_prune
+    now = datetime.datetime.utcnow()
+    with Session(engine) as session:
+        if time.monotonic() - _last_prune > _PRUNE_INTERVAL_SECONDS:
+            _last_prune = time.monotonic()
+            session.exec(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < now))
+            session.commit()
+        session.add(IdempotencyRecord(
+            key=record_key, method=method, path=path,
+            expires_at=now + datetime.timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+        ))
+        try:
+            session.commit()
+            return None
+        except IntegrityError:
+            session.rollback()
+        existing = session.get(IdempotencyRecord, record_key)
+        if existing is not None and existing.expires_at < now:
+            # Expired but not yet pruned: take it over.
+            session.delete(existing)
+            session.commit()
+            return _claim(record_key, method, path)
+        return existing
+
+
+def _load(record_key: str) -> Optional[IdempotencyRecord]:
+    with Session(engine) as session:
+        return session.get(IdempotencyRecord, record_key)
+
+
+def _store(record_key: str, request_hash: Optional[str], status_code: int,
+           content_type: Optional[str], headers: List[list], body: bytes):
+    with Session(engine) as session:
+        record = session.get(IdempotencyRecord, record_key)
+        if record is None:
+            return
+        record.request_hash = request_hash
+        record.status_code = status_code
+        record.content_type = content_type
+        record.headers = json.dumps(headers)
+        record.body = body.decode("utf-8", errors="replace")
+        session.add(record)
+        session.commit()
+        _responses.set(record_key, StoredResponse.from_record(record))
+
+
+def _release(record_key: str):
+    with Session(engine) as session:
+        session.exec(delete(IdempotencyRecord).where(IdempotencyRecord.key == record_key))
+        session.commit()
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in IDEMPOTENT_METHODS
+            or not scope["path"].startswith(IDEMPOTENT_PATH_PREFIX)
+        ):
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        key = headers.get(b"idempotency-key")
+        user_id = self.user_id(headers.get(b"authorization"))
+        if not key or user_id is None:
+            # Unauthenticated requests are left for the handler to reject.
+            return await self.app(scope, receive, send)
+
+        record_key = f"{user_id}:{key.decode('latin-1')}"
+        method, path = scope["method"], scope["path"]
+
+        while True:
+            stored = _responses.get(record_key)
+            if stored is not None:
+                return await self.replay(receive, send, stored, method, path)
+            event = _in_flight.get(record_key)
+            if event is None:
+                break
+            await event.wait()
+
+        event = _in_flight[record_key] = asyncio.Event()
+        try:
+            existing = await run_in_threadpool(_claim, record_key, method, path)
+            if existing is not None:
+                return await self.wait_for_other_worker(receive, send, record_key, existing, method, path)
+            await self.execute(scope, receive, send, record_key)
+        finally:
+            del _in_flight[record_key]
+            event.set()
+
+    def user_id(self, authorization: Optional[bytes]):
+        if not authorization:
+            return None
+        value = authorization.decode("latin-1")
+        if not value.lower().startswith("bearer "):
+            return None
+        try:
+            return jwt.decode(value[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            return None
+
+    async def execute(self, scope, receive, send, record_key: str):
+        start = {}
+        body = bytearray()
+        digest = hashlib.sha256()
+        # None while the request body is still arriving, then whether all of it was hashed.
+        request_complete: Optional[bool] = None
+
+        async def hashing_receive():
+            nonlocal request_complete
+            message = await receive()
+            if message["type"] == "http.request":
+                digest.update(message.get("body", b""))
+                if not message.get("more_body", False):
+                    request_complete = True
+            elif request_complete is None:
+                request_complete = False
+            return message
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                body.extend(message.get("body", b""))
+                if not message.get("more_body", False):
+                    # Hash whatever the handler left unread; the server stops
+                    # delivering the request body once the response is complete.
+                    while request_complete is None:
+                        await hashing_receive()
+            await send(message)
+
+        try:
+            await self.app(scope, hashing_receive, capture)
+        except BaseException:
+            await run_in_threadpool(_release, record_key)
+            raise
+        status_code = start.get("status", 500)
+        if status_code >= 500:
+            # Server errors are not stored, so the client can retry them.
+            await run_in_threadpool(_release, record_key)
+            return
+        headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in start.get("headers", [])]
+        content_type = next((value for name, value in headers if name.lower() == "content-type"), None)
+        replayed = [[name, value] for name, value in headers if name.lower() not in _UNSTORED_HEADERS]
+        request_hash = digest.hexdigest() if request_complete else None
+        await run_in_threadpool(_store, record_key, request_hash, status_code, content_type, replayed, bytes(body))
+
+    async def wait_for_other_worker(self, receive, send, record_key, record, method, path):
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while record is not None and record.status_code is None:
+            if time.monotonic() > deadline:
+                return await self.respond(send, 409, b'{"detail":"A request with this Idempotency-Key is still in progress"}')
+            await asyncio.sleep(0.05)
+            record = await run_in_threadpool(_load, record_key)
+        if record is None:
+            # The other request failed and released the key.
+            return await self.respond(send, 409, b'{"detail":"A request with this Idempotency-Key failed; retry it"}')
+        stored = StoredResponse.from_record(record)
+        _responses.set(record_key, stored)
+        return await self.replay(receive, send, stored, method, path)
+
+    async def replay(self, receive, send, stored: StoredResponse, method: str, path: str):
+        different = stored.method != method or stored.path != path
+        if not different and stored.request_hash is not None:
+            different = await self.hash_body(receive) != stored.request_hash
+        if different:
+            return await self.respond(send, 422, b'{"detail":"Idempotency-Key was already used for a different request"}')
+        return await self.respond(send, stored.status_code, stored.body, stored.content_type,
+                                  stored.headers, replayed=True)
+
+    async def hash_body(self, receive) -> Optional[str]:
+        digest = hashlib.sha256()
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return None
+            digest.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                return digest.hexdigest()
+
+    async def respond(self, send, status_code: int, body: bytes,
+                      content_type: Optional[str] = "application/json", extra_headers: List[tuple] = (),
+                      replayed: bool = False):
+        headers = [(b"content-length", str(len(body)).encode())]
+        if content_type:
+            headers.append((b"content-type", content_type.encode("latin-1")))
+        headers.extend(extra_headers)
+        if replayed:
+            headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
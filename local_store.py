@@ -0,0 +1,113 @@
+# backend/local_store.py
+# Local user storage in local_users.db (for development/testing).
+#
+# Connections come from a small bounded pool and are reused, in WAL mode so
+# readers don't block the writer. Queries use fixed SQL strings so sqlite3's
+# per-connection statement cache keeps them prepared, and email lookups are
+# served from a LocalCache invalidated through the cache bus.
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from pydantic import BaseModel
+
+import cache
+
+LOCAL_USERS_DB = os.getenv("LOCAL_USERS_DB", "local_users.db")
+LOCAL_USERS_POOL_SIZE = int(os.getenv("LOCAL_USERS_POOL_SIZE", "4"))
+
+_CREATE_USERS = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        hashed_password TEXT NOT NULL
+    )
+"""
+_SELECT_BY_EMAIL = "SELECT id, email, hashed_password FROM users WHERE email = ?"
+_INSERT_USER = "INSERT INTO users (email, hashed_password) VALUES (?, ?)"
+
+
+class LocalUser(BaseModel):
+    id: Optional[int] = None
+    email: str
+    hashed_password: str
+
+
+class LocalUserStore:
+    def __init__(self, path: str = LOCAL_USERS_DB, pool_size: int = LOCAL_USERS_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._idle: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self.users = cache.LocalCache(maxsize=4096)
+
+    def _open(self) -> sqlite3.Connection:
+        # Pooled connections move between threads, one at a time.
+        db = sqlite3.connect(self.path, timeout=5.0, cached_statements=64, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Borrows a pooled connection, opening one if fewer than pool_size
+        exist, otherwise waiting for one to be returned.
+        """
+        try:
+            db = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    db = self._open()
+                except BaseException:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                db = self._idle.get()
+        try:
+            yield db
+        finally:
+            self._idle.put(db)
+
+    def init_schema(self):
+        with self.connection() as db, db:
+            db.execute(_CREATE_USERS)
+
+    def get_user_by_email(self, email: str) -> Optional[LocalUser]:
+        def load():
+            with self.connection() as db:
+                row = db.execute(_SELECT_BY_EMAIL, (email,)).fetchone()
+            return LocalUser(**dict(row)) if row else None
+
+        return self.users.get_or_load(f"local_user:{email}", load)
+
+    def add_user(self, email: str, hashed_password: str) -> LocalUser:
+        with self.connection() as db, db:
+            cursor = db.execute(_INSERT_USER, (email, hashed_password))
+        cache.publish(f"local_user:{email}")
+        return LocalUser(id=cursor.lastrowid, email=email, hashed_password=hashed_password)
+
+    def close(self):
+        """Closes the pooled connections; called at shutdown, when none are borrowed."""
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            db.close()
+            with self._lock:
+                self._opened -= 1
+
+
+store = LocalUserStore()
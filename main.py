@@ -1,12 +1,29 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import sqlite3
-from db import create_db_and_tables
-from routes import tasks, auth, chat
+from db import create_db_and_tables, start_replica_sync, stop_replica_sync
+from auth import load_revoked_tokens, start_revocation_sync, stop_revocation_sync
+from ratelimit import RateLimitMiddleware
+from idempotency import IdempotencyMiddleware
+import cache
+import archive
+import group_commit
+import local_store
+import profiling
+from routes import tasks, auth, chat, profiles
 
 app = FastAPI()
 
+# Replays stored responses for task mutations retried with an Idempotency-Key.
+app.add_middleware(IdempotencyMiddleware)
+
+# Rate limiting for bcrypt/model-call endpoints. Added before CORS so that
+# 429 responses still carry CORS headers.
+app.add_middleware(RateLimitMiddleware)
+
+# Per-request profiling, only installed when PROFILING_ENABLED is set.
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfileMiddleware)
+
 # CORS Middleware
 app.add_middleware(
     CORSMiddleware,
@@ -17,32 +34,36 @@ app.add_middleware(
 )
 
 # --- Local User Storage (for development/testing) ---
-class LocalUser(BaseModel):
-    email: str
-    hashed_password: str
+LocalUser = local_store.LocalUser
 
 def get_local_db():
-    db = sqlite3.connect('local_users.db')
-    db.row_factory = sqlite3.Row
-    try:
-        yield db
-    finally:
-        db.close()
+    # Pooled store; connections are borrowed per query instead of opened per request.
+    return local_store.store
 
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    start_replica_sync()
+    cache.start()
+    load_revoked_tokens()
+    start_revocation_sync()
+    archive.start()
+    group_commit.start()
     # Create local user storage table
-    with sqlite3.connect('local_users.db') as db:
-        db.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                hashed_password TEXT NOT NULL
-            )
-        """)
+    local_store.store.init_schema()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    stop_replica_sync()
+    stop_revocation_sync()
+    archive.stop()
+    group_commit.stop()
+    local_store.store.close()
+    cache.stop()
 
 # Include API routers
 app.include_router(tasks.router, prefix="/api")
 app.include_router(auth.router, prefix="/api")
 app.include_router(chat.router, prefix="/api")
+if profiling.PROFILING_ENABLED:
+    app.include_router(profiles.router, prefix="/api")
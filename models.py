@@ -15,7 +15,9 @@ class User(SQLModel, table=True):
     # tasks: List["Task"] = Relationship(back_populates="owner")
 
 class Task(SQLModel, table=True):
-    __table_args__ = {'extend_existing': True}
+    # AUTOINCREMENT on SQLite so ids are never reused: archived tasks keep
+    # their id, and a reused id would clash with them.
+    __table_args__ = {'extend_existing': True, 'sqlite_autoincrement': True}
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(index=True, nullable=False)  # Change to int to match User.id
     title: str
@@ -24,6 +26,54 @@ class Task(SQLModel, table=True):
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, nullable=False)
     updated_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, nullable=False)
     due_date: Optional[datetime.datetime] = None
+    # Bumped on every update; used for optimistic concurrency (If-Match).
+    # The server default covers raw inserts such as COPY in /import.
+    version: int = Field(default=1, nullable=False, sa_column_kwargs={"server_default": "1"})
 
     # Relationship to user
-    # owner: User = Relationship(back_populates="tasks")
\ No newline at end of file
+    # owner: User = Relationship(back_populates="tasks")
+
+class RevokedToken(SQLModel, table=True):
+    __table_args__ = {'extend_existing': True}
+    jti: str = Field(primary_key=True)
+    # "access" or "refresh". Only access jtis are mirrored in memory; refresh
+    # tokens are checked by primary key in /auth/refresh.
+    token_type: str = Field(default="access", nullable=False)
+    # Rows are pruned once the token would have expired anyway.
+    expires_at: datetime.datetime = Field(index=True, nullable=False)
+    # Lets workers load new revocations incrementally.
+    revoked_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True, nullable=False)
+
+
+class ArchivedTask(SQLModel, table=True):
+    # Completed tasks moved out of `task` by archive.py. Ids are kept, so a task
+    # has the same id whether it is hot or archived.
+    __table_args__ = {'extend_existing': True}
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    user_id: int = Field(index=True, nullable=False)
+    title: str
+    description: Optional[str] = None
+    completed: bool = Field(default=True)
+    created_at: datetime.datetime = Field(nullable=False)
+    updated_at: datetime.datetime = Field(nullable=False)
+    due_date: Optional[datetime.datetime] = None
+    version: int = Field(default=1, nullable=False, sa_column_kwargs={"server_default": "1"})
+    archived_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, nullable=False)
+
+
+class IdempotencyRecord(SQLModel, table=True):
+    # Stored responses for requests sent with an Idempotency-Key header.
+    # A row with no status_code is a request still being executed.
+    __table_args__ = {'extend_existing': True}
+    key: str = Field(primary_key=True)  # "<user id>:<Idempotency-Key>"
+    method: str = Field(nullable=False)
+    path: str = Field(nullable=False)
+    # sha256 of the request body, so a key reused with a different body is rejected.
+    request_hash: Optional[str] = None
+    status_code: Optional[int] = None
+    content_type: Optional[str] = None
+    # Other response headers to replay (e.g. ETag), as a JSON list of [name, value].
+    headers: Optional[str] = None
+    body: Optional[str] = None
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, nullable=False)
+    expires_at: datetime.datetime = Field(index=True, nullable=False)
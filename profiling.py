@@ -0,0 +1,240 @@
+# backend/profiling.py
+# Opt-in per-request profiling (PROFILING_ENABLED=true).
+#
+# A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>`, or at
+# random with probability PROFILE_SAMPLE_RATE. The endpoint function runs under
+# cProfile (in the threadpool thread for sync endpoints), SQL time is summed
+# from SQLAlchemy cursor events, and serialization time is measured from the
+# endpoint returning to the response being built. The report is kept in memory
+# and its id returned in the X-Profile-Id header; see routes/profiles.py.
+#
+# When disabled, none of this is installed: routers use the plain APIRoute,
+# no middleware is added and no SQLAlchemy listeners are registered.
+import asyncio
+import cProfile
+import functools
+import io
+import marshal
+import os
+import pstats
+import random
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+PROFILE_TOP_FUNCTIONS = 40
+
+
+class ProfileReport:
+    def __init__(self, method: str, path: str, query: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.query = query
+        self.status_code: Optional[int] = None
+        self.started_at = time.time()
+        self.total_seconds = 0.0
+        self.handler_seconds = 0.0
+        self.endpoint_seconds = 0.0
+        self.serialization_seconds = 0.0
+        self.sql_seconds = 0.0
+        self.sql_queries = 0
+        self.endpoint_returned_at: Optional[float] = None
+        self.profile: Optional[cProfile.Profile] = None
+        self.stats: Optional[pstats.Stats] = None
+
+    def finish(self):
+        if self.profile is not None:
+            self.stats = pstats.Stats(self.profile)
+            self.profile = None
+
+    def pstats_text(self) -> str:
+        if self.stats is None:
+            return ""
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        return out.getvalue()
+
+    def pstats_dump(self) -> bytes:
+        """The same format as pstats.Stats.dump_stats(), for snakeviz etc."""
+        return marshal.dumps(self.stats.stats) if self.stats is not None else b""
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "handler_ms": round(self.handler_seconds * 1000, 3),
+            "endpoint_ms": round(self.endpoint_seconds * 1000, 3),
+            "sql_ms": round(self.sql_seconds * 1000, 3),
+            "sql_queries": self.sql_queries,
+            "serialization_ms": round(self.serialization_seconds * 1000, 3),
+            "pstats": self.pstats_text(),
+        }
+
+
+_current: ContextVar[Optional[ProfileReport]] = ContextVar("profile_report", default=None)
+_reports: "OrderedDict[str, ProfileReport]" = OrderedDict()
+_reports_lock = threading.Lock()
+# cProfile allows one active profiler per thread; concurrent async endpoints
+# share the event loop thread, so only the first of them is profiled.
+_thread_state = threading.local()
+
+
+def get_report(report_id: str) -> Optional[ProfileReport]:
+    with _reports_lock:
+        return _reports.get(report_id)
+
+
+def _keep(report: ProfileReport):
+    with _reports_lock:
+        _reports[report.id] = report
+        while len(_reports) > PROFILE_KEEP:
+            _reports.popitem(last=False)
+
+
+def check_token(value: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and value is not None and secrets.compare_digest(value, PROFILE_TOKEN)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    report = _current.get()
+    if report is not None and conn.info.get("profile_query_start"):
+        report.sql_seconds += time.perf_counter() - conn.info["profile_query_start"].pop()
+        report.sql_queries += 1
+
+
+def _start_profile(report: ProfileReport) -> bool:
+    if getattr(_thread_state, "active", False):
+        return False
+    _thread_state.active = True
+    if report.profile is None:
+        report.profile = cProfile.Profile()
+    report.profile.enable()
+    return True
+
+
+def _stop_profile(report: ProfileReport):
+    report.profile.disable()
+    _thread_state.active = False
+
+
+def _profiled(endpoint):
+    """Wraps an endpoint so it runs under the current request's profiler."""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            report = _current.get()
+            if report is None:
+                return await endpoint(*args, **kwargs)
+            started = time.perf_counter()
+            profiling = _start_profile(report)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                if profiling:
+                    _stop_profile(report)
+                report.endpoint_returned_at = time.perf_counter()
+                report.endpoint_seconds = report.endpoint_returned_at - started
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            report = _current.get()
+            if report is None:
+                return endpoint(*args, **kwargs)
+            started = time.perf_counter()
+            profiling = _start_profile(report)
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                if profiling:
+                    _stop_profile(report)
+                report.endpoint_returned_at = time.perf_counter()
+                report.endpoint_seconds = report.endpoint_returned_at - started
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            report = _current.get()
+            if report is None:
+                return await handler(request)
+            started = time.perf_counter()
+            response = await handler(request)
+            finished = time.perf_counter()
+            report.handler_seconds = finished - started
+            if report.endpoint_returned_at is not None:
+                # Response model validation, jsonable_encoder and rendering.
+                report.serialization_seconds = finished - report.endpoint_returned_at
+            return response
+
+        return profiled_handler
+
+
+# Routers pass this as route_class, so profiling costs nothing when disabled.
+route_class = ProfiledRoute if PROFILING_ENABLED else APIRoute
+
+
+class ProfileMiddleware:
+    def __init__(self, app):
+        self.app = app
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        requested = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                requested = value.decode("latin-1")
+                break
+        if not check_token(requested) and not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+            return await self.app(scope, receive, send)
+
+        report = ProfileReport(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"))
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                report.status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", report.id.encode())]}
+            await send(message)
+
+        token = _current.set(report)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            report.total_seconds = time.perf_counter() - started
+            _current.reset(token)
+            report.finish()
+            _keep(report)
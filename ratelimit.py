@@ -0,0 +1,121 @@
+# backend/ratelimit.py
+# Token-bucket rate limiting for expensive endpoints (bcrypt, model calls).
+#
+# Implemented as plain ASGI middleware: requests to paths without a configured
+# limit are passed straight through after a single dict lookup.
+import json
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+
+from auth import SECRET_KEY, ALGORITHM
+
+# path -> (requests per minute, burst). Override with RATE_LIMITS, e.g.
+# RATE_LIMITS="/api/auth/login=10:5,/api/chat=20:5"
+DEFAULT_RATE_LIMITS = {
+    "/api/auth/login": (10, 5),
+    "/api/auth/signup": (5, 3),
+    "/api/chat": (20, 5),
+}
+
+# Buckets untouched for this long are dropped; a fresh bucket is full anyway.
+IDLE_EVICTION_SECONDS = float(os.getenv("RATE_LIMIT_IDLE_SECONDS", "600"))
+
+
+def parse_rate_limits(value: Optional[str]) -> Dict[str, Tuple[float, float]]:
+    if not value:
+        return dict(DEFAULT_RATE_LIMITS)
+    limits = {}
+    for item in value.split(","):
+        path, _, spec = item.strip().partition("=")
+        per_minute, _, burst = spec.partition(":")
+        limits[path] = (float(per_minute), float(burst or per_minute))
+    return limits
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, limits: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.app = app
+        if limits is None:
+            limits = parse_rate_limits(os.getenv("RATE_LIMITS"))
+        # path -> (tokens per second, capacity)
+        self.limits = {path: (rate / 60.0, burst) for path, (rate, burst) in limits.items()}
+        # (path, "ip:<addr>" | "user:<id>") -> [tokens, last refill time]
+        self.buckets: Dict[Tuple[str, str], list] = {}
+        self.next_sweep = time.monotonic() + IDLE_EVICTION_SECONDS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = self.limits.get(scope["path"])
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.sweep(now)
+
+        retry_after = 0.0
+        for key in self.keys(scope):
+            retry_after = max(retry_after, self.take(scope["path"], key, limit, now))
+        if retry_after > 0:
+            return await self.reject(send, retry_after)
+        return await self.app(scope, receive, send)
+
+    def keys(self, scope):
+        client = scope.get("client")
+        keys = [f"ip:{client[0] if client else 'unknown'}"]
+        user_id = self.user_id(scope)
+        if user_id is not None:
+            keys.append(f"user:{user_id}")
+        return keys
+
+    def user_id(self, scope):
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                value = value.decode("latin-1")
+                if value.lower().startswith("bearer "):
+                    try:
+                        return jwt.decode(value[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+                    except JWTError:
+                        return None
+        return None
+
+    def take(self, path: str, key: str, limit: Tuple[float, float], now: float) -> float:
+        """
+        Takes one token from the bucket. Returns 0 on success, otherwise the
+        number of seconds until a token is available.
+        """
+        rate, capacity = limit
+        bucket = self.buckets.get((path, key))
+        if bucket is None:
+            bucket = self.buckets[(path, key)] = [capacity, now]
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    def sweep(self, now: float):
+        idle = [key for key, (_, last) in self.buckets.items() if now - last > IDLE_EVICTION_SECONDS]
+        for key in idle:
+            del self.buckets[key]
+        self.next_sweep = now + IDLE_EVICTION_SECONDS
+
+    async def reject(self, send, retry_after: float):
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
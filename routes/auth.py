@@ -1,22 +1,54 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
+from pydantic import BaseModel
 from sqlmodel import Session, select
-from typing import Annotated
-from datetime import timedelta
+from typing import Annotated, Optional
 
-from db import get_session
+from db import get_session, mark_write
 from models import User
-from auth import SECRET_KEY, ALGORITHM, create_access_token, get_current_user
+from auth import (
+    SECRET_KEY, ALGORITHM, create_access_token, create_refresh_token,
+    get_current_user, revoke_token,
+)
 from passlib.context import CryptContext
-from jose import jwt
+from jose import JWTError, jwt
+import cache
+import profiling
 
 router = APIRouter(
     prefix="/auth",
     tags=["auth"],
+    route_class=profiling.route_class,
 )
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Same as auth.oauth2_scheme, but logout still succeeds without a token.
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
+def token_response(user: User):
+    return {
+        "access_token": create_access_token(data={"sub": str(user.id)}),
+        "refresh_token": create_refresh_token(user.id),
+        "token_type": "bearer",
+        "user": {"id": user.id, "email": user.email},
+    }
+
+def decode_token(token: str, token_type: str):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("type", "access") != token_type:
+        return None
+    return payload
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -41,12 +73,12 @@ async def signup(
     session.add(new_user)
     session.commit()
     session.refresh(new_user)
+    cache.publish(f"user:{new_user.id}")
+    # Signup carries no bearer token, so get_session could not tell whose
+    # write this was; keep the new user's next reads on the primary.
+    mark_write(str(new_user.id))
 
-    access_token_expires = timedelta(minutes=30) # You can adjust this
-    access_token = create_access_token(
-        data={"sub": str(new_user.id)}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer", "user": {"id": new_user.id, "email": new_user.email}}
+    return token_response(new_user)
 
 @router.post("/login")
 async def login(
@@ -66,16 +98,53 @@ async def login(
             detail="Incorrect password", # More specific error
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=30) # You can adjust this
-    access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+    return token_response(user)
+
+@router.post("/refresh")
+async def refresh(
+    body: RefreshRequest,
+    session: Annotated[Session, Depends(get_session)]
+):
+    """
+    Exchanges a refresh token for a new access/refresh pair. The old refresh
+    token is revoked, so each one can be used only once.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer", "user": {"id": user.id, "email": user.email}}
+    payload = decode_token(body.refresh_token, "refresh")
+    if payload is None:
+        raise credentials_exception
+    try:
+        user = session.get(User, int(payload.get("sub")))
+    except (TypeError, ValueError):
+        raise credentials_exception
+    if user is None:
+        raise credentials_exception
+
+    # Revoking is an INSERT on the jti, so of two concurrent refreshes with
+    # the same token only one succeeds; a reused token fails the same way.
+    if not revoke_token(payload):
+        raise credentials_exception
+    return token_response(user)
 
 @router.post("/logout")
-async def logout():
-    # On the backend, logout is essentially just returning a success.
-    # The client is responsible for discarding the token.
+async def logout(
+    token: Annotated[Optional[str], Depends(optional_oauth2_scheme)],
+    body: Optional[LogoutRequest] = None
+):
+    # Revoke the presented access token and, if given, the refresh token.
+    # The client should still discard both.
+    if token:
+        payload = decode_token(token, "access")
+        if payload is not None:
+            revoke_token(payload)
+    if body is not None and body.refresh_token:
+        payload = decode_token(body.refresh_token, "refresh")
+        if payload is not None:
+            revoke_token(payload)
     return {"message": "Logout successful"}
 
 @router.get("/session")
@@ -1,9 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+import datetime
 import os
 from dotenv import load_dotenv
 import google.generativeai as genai
-from typing import Optional
+from typing import Optional, Annotated
+from sqlalchemy import Integer, cast, func
+from sqlmodel import Session, select
+
+from db import get_session, read_only
+from models import Task, User
+from auth import get_current_user
+import cache
+import profiling
 
 # Load environment variables
 load_dotenv()
@@ -12,12 +22,13 @@ load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API_KEY"))
 
 # Create the FastAPI router
-router = APIRouter()
+router = APIRouter(route_class=profiling.route_class)
 
 # Define request and response models
 class ChatRequest(BaseModel):
     message: str
     history: Optional[list] = []
+    include_tasks: bool = True
 
 class ChatResponse(BaseModel):
     response: str
@@ -26,14 +37,76 @@ class ChatResponse(BaseModel):
 # Initialize the generative model
 model = genai.GenerativeModel('gemini-1.5-flash')
 
+# Task digests sent along with chat messages
+DIGEST_TOP_N = int(os.getenv("CHAT_DIGEST_TOP_N", "10"))
+DIGEST_MAX_CHARS = int(os.getenv("CHAT_DIGEST_MAX_CHARS", "1500"))
+DIGEST_TITLE_CHARS = 80
+
+# user's digest, keyed "tasks:<user id>" so the task mutation handlers'
+# cache.publish() calls invalidate it. The TTL catches tasks becoming overdue.
+digest_cache = cache.LocalCache(maxsize=4096, ttl=300)
+
+def build_task_digest(session: Session, user_id: int) -> str:
+    """
+    Summarizes the user's open tasks: counts, then the first DIGEST_TOP_N
+    by due date (overdue ones flagged), capped at DIGEST_MAX_CHARS.
+    """
+    now = datetime.datetime.utcnow()
+    total, completed, overdue = session.exec(
+        select(
+            func.count(Task.id),
+            func.coalesce(func.sum(cast(Task.completed, Integer)), 0),
+            func.count(Task.id).filter(Task.completed == False, Task.due_date < now),
+        ).where(Task.user_id == user_id)
+    ).one()
+    upcoming = session.exec(
+        select(Task.title, Task.due_date)
+        .where(Task.user_id == user_id, Task.completed == False)
+        .order_by(Task.due_date.is_(None), Task.due_date, Task.created_at)
+        .limit(DIGEST_TOP_N)
+    ).all()
+
+    lines = [f"The user has {total} tasks: {total - completed} open, {completed} completed, {overdue} overdue."]
+    if upcoming:
+        lines.append("Open tasks by due date:")
+    for title, due_date in upcoming:
+        if len(title) > DIGEST_TITLE_CHARS:
+            title = title[:DIGEST_TITLE_CHARS - 3] + "..."
+        if due_date is None:
+            lines.append(f"- {title} (no due date)")
+        elif due_date < now:
+            lines.append(f"- {title} (OVERDUE, due {due_date:%Y-%m-%d})")
+        else:
+            lines.append(f"- {title} (due {due_date:%Y-%m-%d})")
+
+    digest = ""
+    for line in lines:
+        if len(digest) + len(line) + 1 > DIGEST_MAX_CHARS:
+            break
+        digest += line + "\n"
+    return digest
+
+def get_task_digest(session: Session, user_id: int) -> str:
+    return digest_cache.get_or_load(f"tasks:{user_id}", lambda: build_task_digest(session, user_id))
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+@read_only
+async def chat_endpoint(
+    request: ChatRequest,
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)]
+):
     """
     Endpoint to handle chat requests and return AI-generated responses
     """
     try:
+        prompt = request.message
+        if request.include_tasks:
+            digest = await run_in_threadpool(get_task_digest, session, current_user.id)
+            prompt = f"Context about the user's tasks:\n{digest}\nUser message: {request.message}"
+
         # Generate content using the Gemini model
-        response = model.generate_content(request.message)
+        response = model.generate_content(prompt)
         
         # Extract the text from the response
         ai_response = response.text if response.text else "I couldn't generate a response. Please try again."
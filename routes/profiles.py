@@ -0,0 +1,35 @@
+# backend/routes/profiles.py
+# Retrieval of per-request profiles recorded by profiling.py. Only included
+# when PROFILING_ENABLED is set; requires the same X-Profile token.
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import Response
+from typing import Annotated, Optional
+
+import profiling
+
+router = APIRouter(
+    prefix="/profiles",
+    tags=["profiles"],
+)
+
+def _get_report(report_id: str, token: Optional[str]):
+    if not profiling.check_token(token):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid profiling token")
+    report = profiling.get_report(report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+@router.get("/{report_id}")
+def read_profile(report_id: str, x_profile: Annotated[Optional[str], Header()] = None):
+    return _get_report(report_id, x_profile).to_dict()
+
+@router.get("/{report_id}/pstats")
+def download_profile(report_id: str, x_profile: Annotated[Optional[str], Header()] = None):
+    """Raw stats, loadable with pstats.Stats(path) or snakeviz."""
+    report = _get_report(report_id, x_profile)
+    return Response(
+        content=report.pstats_dump(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{report_id}.pstats"'},
+    )
@@ -1,16 +1,29 @@
 # backend/routes/tasks.py (updated with authentication)
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session, select, SQLModel, Field
+from sqlalchemy import insert, not_, union_all, update
+from sqlalchemy.engine import Connection
+from pydantic import ValidationError
 from typing import List, Optional, Union, Annotated
+import csv
 import datetime
+import io
+import json
+import time
 
-from db import get_session
-from models import Task, User
+from db import get_session, engine, read_engine, read_only, wrote_recently
+from models import ArchivedTask, Task, User
 from auth import get_current_user
+import cache
+import profiling
+import group_commit
 
 router = APIRouter(
     prefix="/tasks",
     tags=["tasks"],
+    route_class=profiling.route_class,
 )
 
 class TaskCreate(SQLModel):
@@ -26,6 +39,7 @@ class TaskRead(SQLModel):
     created_at: datetime.datetime
     updated_at: datetime.datetime
     due_date: Optional[datetime.datetime] = None
+    version: int = 1
 
 class TaskUpdate(SQLModel):
     title: Optional[str] = Field(default=None, min_length=1, max_length=200)
@@ -33,6 +47,26 @@ class TaskUpdate(SQLModel):
     completed: Optional[bool] = None
     due_date: Optional[datetime.datetime] = None
 
+MAX_LOOKUP_IDS = 200
+
+class TaskImport(TaskCreate):
+    completed: bool = False
+    created_at: Optional[datetime.datetime] = None
+    updated_at: Optional[datetime.datetime] = None
+
+class TaskLookup(SQLModel):
+    ids: List[int] = Field(min_length=1, max_length=MAX_LOOKUP_IDS)
+    include_archived: bool = False
+
+class TaskLookupResult(SQLModel):
+    tasks: List[TaskRead]
+    not_found: List[int]
+    forbidden: List[int]
+
+TASK_FIELDS = ["id", "title", "description", "completed", "created_at", "updated_at", "due_date", "version"]
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 1000
+
 
 @router.get("/tasks", response_model=List[TaskRead])
 def read_tasks(
@@ -40,38 +74,101 @@ def read_tasks(
     session: Session = Depends(get_session),
     current_user: Annotated[User, Depends(get_current_user)],
     completed: Optional[bool] = None,
-    sort: Optional[str] = None # Added sort parameter
+    sort: Optional[str] = None, # Added sort parameter
+    include_archived: bool = False
 ):
-    query = select(Task).where(Task.user_id == current_user.id)
+    if include_archived:
+        # Union the archive in so filtering and sorting still happen in SQL.
+        source = union_all(
+            select(*[getattr(Task, f) for f in TASK_FIELDS]).where(Task.user_id == current_user.id),
+            select(*[getattr(ArchivedTask, f) for f in TASK_FIELDS]).where(ArchivedTask.user_id == current_user.id),
+        ).subquery()
+        columns = source.c
+        query = select(source)
+    else:
+        columns = Task
+        query = select(Task).where(Task.user_id == current_user.id)
     if completed is not None:
-        query = query.where(Task.completed == completed)
+        query = query.where(columns.completed == completed)
     
     # Add sorting logic
     if sort == "created":
-        query = query.order_by(Task.created_at)
+        query = query.order_by(columns.created_at)
     elif sort == "title":
-        query = query.order_by(Task.title)
+        query = query.order_by(columns.title)
     elif sort == "due_date":
-        query = query.order_by(Task.due_date)
+        query = query.order_by(columns.due_date)
     # Default sorting (e.g., by created_at descending) can be added here if desired
     else:
-        query = query.order_by(Task.created_at.desc()) # Default sort to most recent first
+        query = query.order_by(columns.created_at.desc()) # Default sort to most recent first
 
+    if include_archived:
+        return session.execute(query).mappings().all()
     tasks = session.exec(query).all()
     return tasks
 
+@router.post("/tasks/lookup", response_model=TaskLookupResult)
+@read_only
+def lookup_tasks(
+    *,
+    session: Session = Depends(get_session),
+    lookup: TaskLookup,
+    current_user: Annotated[User, Depends(get_current_user)]
+):
+    """
+    Fetches many tasks by id with one IN query scoped to the current user,
+    reporting each id as found, not found or forbidden. Only the ids of
+    other users' tasks are read, to tell forbidden from not found. Tasks are
+    returned in the order requested.
+    """
+    ids = list(dict.fromkeys(lookup.ids))
+    rows = {
+        task.id: task
+        for task in session.exec(select(Task).where(Task.id.in_(ids), Task.user_id == current_user.id)).all()
+    }
+    missing = [task_id for task_id in ids if task_id not in rows]
+    if missing and lookup.include_archived:
+        archived = session.exec(
+            select(ArchivedTask).where(ArchivedTask.id.in_(missing), ArchivedTask.user_id == current_user.id)
+        ).all()
+        rows.update({task.id: task for task in archived})
+        missing = [task_id for task_id in missing if task_id not in rows]
+
+    forbidden = set()
+    if missing:
+        query = select(Task.id).where(Task.id.in_(missing))
+        if lookup.include_archived:
+            query = union_all(query, select(ArchivedTask.id).where(ArchivedTask.id.in_(missing)))
+        forbidden = set(session.execute(query).scalars())
+
+    result = TaskLookupResult(tasks=[], not_found=[], forbidden=[])
+    for task_id in ids:
+        task = rows.get(task_id)
+        if task is not None:
+            result.tasks.append(TaskRead.model_validate(task))
+        elif task_id in forbidden:
+            result.forbidden.append(task_id)
+        else:
+            result.not_found.append(task_id)
+    return result
+
 @router.get("/tasks/{task_id}", response_model=TaskRead)
 def read_task_by_id(
     *,
     session: Session = Depends(get_session),
     task_id: int,
-    current_user: Annotated[User, Depends(get_current_user)]
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_user)],
+    include_archived: bool = False
 ):
     task = session.get(Task, task_id)
+    if not task and include_archived:
+        task = session.get(ArchivedTask, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     if task.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view this task")
+    response.headers["ETag"] = f'"{task.version}"'
     return task
 
 @router.post("/tasks", response_model=TaskRead)
@@ -81,37 +178,128 @@ def create_task(
     task: TaskCreate,
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    db_task = Task(**task.model_dump(), user_id=current_user.id)
-    session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
+    def create(session: Session):
+        db_task = Task(**task.model_dump(), user_id=current_user.id)
+        session.add(db_task)
+        session.flush()
+        session.refresh(db_task)
+        return db_task
+
+    db_task = _run_write(session, create)
+    cache.publish(f"tasks:{current_user.id}")
     print(f"Task created: '{db_task.title}' by user '{current_user.email}'")
     return db_task
 
+def _run_write(session: Session, op):
+    """
+    Runs a mutation `op(session)` and commits it: in this request's session,
+    or batched with concurrent mutations when group commit is enabled. Either
+    way it returns only after the commit.
+    """
+    if group_commit.enabled():
+        return group_commit.committer.submit(op)
+    result = op(session)
+    session.commit()
+    return result
+
+def _expected_version(if_match: Optional[str], expected_version: Optional[int]) -> Optional[int]:
+    """
+    Reads the version the client based its change on, from If-Match ("3",
+    W/"3" or *) or the expected_version query parameter.
+    """
+    if if_match is not None and if_match.strip() != "*":
+        value = if_match.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        try:
+            return int(value.strip('"'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="If-Match must be a task version")
+    return expected_version
+
+def _restore_archived(
+    session: Session,
+    task_id: int,
+    current_user: User,
+    expected_version: Optional[int],
+    action: str,
+):
+    """
+    Moves an archived task back into the live table, keeping its id. All
+    checks happen before anything is written.
+    """
+    archived = session.get(ArchivedTask, task_id)
+    if not archived:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if archived.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail=f"Not authorized to {action} this task")
+    if expected_version is not None and archived.version != expected_version:
+        raise HTTPException(
+            status_code=412,
+            detail=f"Task was modified by another request (current version {archived.version})",
+            headers={"ETag": f'"{archived.version}"'},
+        )
+    session.add(Task(
+        **{f: getattr(archived, f) for f in TASK_FIELDS},
+        user_id=archived.user_id,
+    ))
+    session.delete(archived)
+    session.flush()
+
+def _conditional_update(
+    session: Session,
+    task_id: int,
+    current_user: User,
+    expected_version: Optional[int],
+    values: dict,
+    action: str,
+) -> Task:
+    """
+    Applies `values` in a single UPDATE guarded by the owner and, if given,
+    the expected version, bumping the version. No row lock is taken; a lost
+    race shows up as zero rows updated and is reported as 412.
+    Does not commit; run it through _run_write.
+    """
+    statement = update(Task).where(Task.id == task_id, Task.user_id == current_user.id)
+    if expected_version is not None:
+        statement = statement.where(Task.version == expected_version)
+    statement = statement.values(**values, version=Task.version + 1)
+
+    if session.execute(statement).rowcount == 0:
+        db_task = session.get(Task, task_id)
+        if not db_task:
+            # Editing an archived task brings it back to the live table.
+            _restore_archived(session, task_id, current_user, expected_version, action)
+            return _conditional_update(session, task_id, current_user, expected_version, values, action)
+        if db_task.user_id != current_user.id:
+            raise HTTPException(status_code=403, detail=f"Not authorized to {action} this task")
+        raise HTTPException(
+            status_code=412,
+            detail=f"Task was modified by another request (current version {db_task.version})",
+            headers={"ETag": f'"{db_task.version}"'},
+        )
+    return session.get(Task, task_id, populate_existing=True)
+
 @router.put("/tasks/{task_id}", response_model=TaskRead)
 def update_task(
     *,
     session: Session = Depends(get_session),
     task_id: int,
     task: TaskUpdate,
-    current_user: Annotated[User, Depends(get_current_user)]
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_user)],
+    if_match: Annotated[Optional[str], Header()] = None,
+    expected_version: Optional[int] = None
 ):
-    db_task = session.get(Task, task_id)
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    if db_task.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to update this task")
-
-    task_data = task.model_dump(exclude_unset=True)
-    for key, value in task_data.items():
-        setattr(db_task, key, value)
-    
-    db_task.updated_at = datetime.datetime.utcnow()
-    
-    session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
+    values = task.model_dump(exclude_unset=True)
+    values["updated_at"] = datetime.datetime.utcnow()
+    expected = _expected_version(if_match, expected_version)
+    db_task = _run_write(
+        session, lambda s: _conditional_update(s, task_id, current_user, expected, values, "update")
+    )
+    cache.publish(f"tasks:{current_user.id}")
     print(f"Task updated: '{db_task.title}' by user '{current_user.email}'")
+    response.headers["ETag"] = f'"{db_task.version}"'
     return db_task
 
 @router.delete("/tasks/{task_id}")
@@ -121,15 +309,18 @@ def delete_task(
     task_id: int,
     current_user: Annotated[User, Depends(get_current_user)]
 ):
-    db_task = session.get(Task, task_id)
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    if db_task.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this task")
-    
+    def delete(session: Session):
+        db_task = session.get(Task, task_id) or session.get(ArchivedTask, task_id)
+        if not db_task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if db_task.user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to delete this task")
+        session.delete(db_task)
+        return db_task
+
+    db_task = _run_write(session, delete)
     print(f"Task deleted: '{db_task.title}' by user '{current_user.email}'")
-    session.delete(db_task)
-    session.commit()
+    cache.publish(f"tasks:{current_user.id}")
     return {"ok": True, "deleted_task": db_task}
 
 @router.patch("/tasks/{task_id}/complete", response_model=TaskRead)
@@ -137,18 +328,195 @@ def complete_task(
     *,
     session: Session = Depends(get_session),
     task_id: int,
-    current_user: Annotated[User, Depends(get_current_user)]
+    response: Response,
+    current_user: Annotated[User, Depends(get_current_user)],
+    if_match: Annotated[Optional[str], Header()] = None,
+    expected_version: Optional[int] = None
 ):
-    db_task = session.get(Task, task_id)
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    if db_task.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to complete this task")
-
-    db_task.completed = not db_task.completed
-    db_task.updated_at = datetime.datetime.utcnow()
-    
-    session.add(db_task)
-    session.commit()
-    session.refresh(db_task)
+    # The toggle happens in SQL, so concurrent toggles never lose an update.
+    values = {"completed": not_(Task.completed), "updated_at": datetime.datetime.utcnow()}
+    expected = _expected_version(if_match, expected_version)
+    db_task = _run_write(
+        session, lambda s: _conditional_update(s, task_id, current_user, expected, values, "complete")
+    )
+    cache.publish(f"tasks:{current_user.id}")
+    response.headers["ETag"] = f'"{db_task.version}"'
     return db_task
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+def _export_rows(user_id: int, fmt: str, include_archived: bool):
+    """
+    Streams the user's tasks using a server-side cursor, so memory stays
+    constant regardless of how many tasks the user has.
+    """
+    bind = engine if wrote_recently(str(user_id)) else read_engine
+    models = [Task, ArchivedTask] if include_archived else [Task]
+    with Session(bind) as session:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(TASK_FIELDS)
+        partitions = (
+            partition
+            for model in models
+            for partition in session.exec(
+                select(model)
+                .where(model.user_id == user_id)
+                .order_by(model.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            ).partitions()
+        )
+        for partition in partitions:
+            for task in partition:
+                row = TaskRead.model_validate(task)
+                if fmt == "csv":
+                    writer.writerow([_csv_value(getattr(row, f)) for f in TASK_FIELDS])
+                else:
+                    buffer.write(row.model_dump_json())
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+@router.get("/export")
+def export_tasks(
+    *,
+    current_user: Annotated[User, Depends(get_current_user)],
+    format: str = "ndjson",
+    include_archived: bool = True
+):
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(current_user.id, format, include_archived),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'},
+    )
+
+async def _read_records(request: Request, fmt: str):
+    """
+    Yields (line_number, dict) records from the request body as it arrives.
+    CSV records may span lines when a quoted field contains a newline.
+    """
+    pending = b""
+    header = None
+    record = ""
+    line_number = 0
+
+    async def lines():
+        nonlocal pending
+        async for chunk in request.stream():
+            pending += chunk
+            *complete, pending = pending.split(b"\n")
+            for line in complete:
+                yield line.decode("utf-8") + "\n"
+        if pending:
+            yield pending.decode("utf-8")
+
+    async for line in lines():
+        line_number += 1
+        if fmt == "ndjson":
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    raise HTTPException(status_code=422, detail=f"Invalid JSON on line {line_number}")
+            continue
+
+        record += line
+        # An odd number of quotes means we are inside a quoted field.
+        if record.count('"') % 2:
+            continue
+        if record.strip():
+            values = next(csv.reader([record]))
+            if header is None:
+                header = values
+            else:
+                yield line_number, {k: (v if v != "" else None) for k, v in zip(header, values)}
+        record = ""
+
+def _insert_batch(conn: Connection, rows: List[dict]):
+    if conn.dialect.name == "postgresql":
+        # COPY is considerably faster than multi-row INSERT on Postgres.
+        columns = list(rows[0].keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([_csv_value(row[c]) for c in columns])
+        buffer.seek(0)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(f"COPY task ({', '.join(columns)}) FROM STDIN WITH CSV", buffer)
+    else:
+        conn.execute(insert(Task), rows)
+
+@router.post("/import")
+async def import_tasks(
+    *,
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    format: Optional[str] = None
+):
+    """
+    Imports tasks from an NDJSON or CSV body (as produced by /export).
+    Rows are inserted in batches of IMPORT_BATCH_SIZE; ids are reassigned.
+    All batches share one transaction, so an invalid row imports nothing and
+    the corrected file can simply be sent again.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+
+    started = time.perf_counter()
+    imported = 0
+    batch: List[dict] = []
+    conn = await run_in_threadpool(engine.connect)
+    try:
+        async for line_number, data in _read_records(request, format):
+            try:
+                item = TaskImport.model_validate(data)
+            except ValidationError as e:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Invalid task on line {line_number}: {e.errors()[0]['msg']}",
+                )
+            now = datetime.datetime.utcnow()
+            batch.append({
+                "user_id": current_user.id,
+                "title": item.title,
+                "description": item.description,
+                "completed": item.completed,
+                "created_at": item.created_at or now,
+                "updated_at": item.updated_at or now,
+                "due_date": item.due_date,
+                "version": 1,
+            })
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                await run_in_threadpool(_insert_batch, conn, batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            await run_in_threadpool(_insert_batch, conn, batch)
+            imported += len(batch)
+        await run_in_threadpool(conn.commit)
+    finally:
+        # Rolls back unless committed above.
+        await run_in_threadpool(conn.close)
+
+    if imported:
+        cache.publish(f"tasks:{current_user.id}")
+    elapsed = time.perf_counter() - started
+    print(f"Imported {imported} tasks for user '{current_user.email}' in {elapsed:.2f}s")
+    return {
+        "imported": imported,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(imported / elapsed) if elapsed > 0 else imported,
+    }
@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its configuration at import time, so point it at scratch
+# storage before anything imports db.
+_tmp = tempfile.mkdtemp(prefix="in_memory_app-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ.setdefault("LOCAL_USERS_DB", f"{_tmp}/local_users.db")
+os.environ.setdefault("CACHE_BUS_DIR", f"{_tmp}/bus")
+os.environ.setdefault("ARCHIVE_ENABLED", "false")
+os.environ.setdefault("RATE_LIMITS", "/api/chat=20:5")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlmodel import SQLModel
+
+import auth
+import db
+import idempotency
+from main import app
+
+
+@pytest.fixture
+def client():
+    SQLModel.metadata.drop_all(db.engine)
+    auth.user_cache.clear()
+    auth._revoked.clear()
+    idempotency._responses.data.clear()
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def tokens(client):
+    response = client.post("/api/auth/signup", data={"username": "user@example.com", "password": "secret"})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.fixture
+def headers(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
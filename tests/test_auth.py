@@ -0,0 +1,16 @@
+def test_refresh_token_can_only_be_used_once(client, tokens):
+    body = {"refresh_token": tokens["refresh_token"]}
+    rotated = client.post("/api/auth/refresh", json=body)
+    assert rotated.status_code == 200
+
+    assert client.post("/api/auth/refresh", json=body).status_code == 401
+    # The tokens from the successful rotation still work.
+    new_tokens = rotated.json()
+    session = client.get("/api/auth/session", headers={"Authorization": f"Bearer {new_tokens['access_token']}"})
+    assert session.status_code == 200
+    assert client.post("/api/auth/refresh", json={"refresh_token": new_tokens["refresh_token"]}).status_code == 200
+
+
+def test_logout_revokes_access_token(client, headers):
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert client.get("/api/auth/session", headers=headers).status_code == 401
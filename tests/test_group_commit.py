@@ -0,0 +1,35 @@
+import threading
+
+from sqlmodel import Session
+
+import db
+from group_commit import GroupCommitter
+from models import User
+from routes.tasks import _conditional_update
+
+
+def test_updates_in_one_batch_get_their_own_results(client, headers):
+    task_id = client.post("/api/tasks/tasks", json={"title": "t"}, headers=headers).json()["id"]
+    with Session(db.engine) as session:
+        user = session.get(User, 1)
+    # A wide window so both updates land in the same batch.
+    committer = GroupCommitter(bind=db.engine, window_ms=300)
+    results = {}
+
+    def update(title):
+        results[title] = committer.submit(
+            lambda s: _conditional_update(s, task_id, user, None, {"title": title}, "update")
+        )
+
+    threads = [threading.Thread(target=update, args=(title,)) for title in ("A", "B")]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        committer.stop()
+
+    assert results["A"].title == "A"
+    assert results["B"].title == "B"
+    assert {results["A"].version, results["B"].version} == {2, 3}
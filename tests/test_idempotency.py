@@ -0,0 +1,32 @@
+import idempotency
+
+
+def test_retry_replays_stored_response(client, headers):
+    keyed = {**headers, "Idempotency-Key": "create-1"}
+    first = client.post("/api/tasks/tasks", json={"title": "t"}, headers=keyed)
+    retry = client.post("/api/tasks/tasks", json={"title": "t"}, headers=keyed)
+
+    assert retry.status_code == first.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(client.get("/api/tasks/tasks", headers=headers).json()) == 1
+
+
+def test_replay_from_database_keeps_etag(client, headers):
+    task_id = client.post("/api/tasks/tasks", json={"title": "t"}, headers=headers).json()["id"]
+    keyed = {**headers, "Idempotency-Key": "update-1"}
+    first = client.put(f"/api/tasks/tasks/{task_id}", json={"title": "u"}, headers=keyed)
+    idempotency._responses.data.clear()
+
+    retry = client.put(f"/api/tasks/tasks/{task_id}", json={"title": "u"}, headers=keyed)
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.headers["etag"] == first.headers["etag"]
+
+
+def test_key_reused_with_different_body_is_rejected(client, headers):
+    keyed = {**headers, "Idempotency-Key": "create-1"}
+    client.post("/api/tasks/tasks", json={"title": "t"}, headers=keyed)
+
+    response = client.post("/api/tasks/tasks", json={"title": "other"}, headers=keyed)
+    assert response.status_code == 422
+    assert len(client.get("/api/tasks/tasks", headers=headers).json()) == 1
@@ -0,0 +1,81 @@
+import datetime
+
+from sqlmodel import Session
+
+import archive
+import db
+import routes.tasks
+from models import Task
+
+
+def _age(task_id: int):
+    with Session(db.engine) as session:
+        task = session.get(Task, task_id)
+        task.updated_at = datetime.datetime(2000, 1, 1)
+        session.add(task)
+        session.commit()
+
+
+def test_archive_round_trip_keeps_ids(client, headers):
+    ids = [client.post("/api/tasks/tasks", json={"title": f"t{i}"}, headers=headers).json()["id"] for i in range(3)]
+    client.patch(f"/api/tasks/tasks/{ids[-1]}/complete", headers=headers)
+    _age(ids[-1])
+
+    assert archive.archive_completed_tasks() == 1
+    assert client.get(f"/api/tasks/tasks/{ids[-1]}", headers=headers).status_code == 404
+
+    # A new task must not reuse the archived task's id.
+    new_id = client.post("/api/tasks/tasks", json={"title": "new"}, headers=headers).json()["id"]
+    assert new_id not in ids
+
+    listed = client.get("/api/tasks/tasks?include_archived=true", headers=headers).json()
+    assert sorted(t["id"] for t in listed) == sorted(ids + [new_id])
+    assert {t["id"]: t["version"] for t in listed}[ids[-1]] == 2
+
+    # Updating an archived task brings it back.
+    restored = client.patch(f"/api/tasks/tasks/{ids[-1]}/complete", headers=headers)
+    assert restored.status_code == 200
+    assert restored.json()["completed"] is False
+    assert restored.json()["version"] == 3
+    assert client.get(f"/api/tasks/tasks/{ids[-1]}", headers=headers).status_code == 200
+
+
+def test_stale_if_match_is_rejected(client, headers):
+    created = client.post("/api/tasks/tasks", json={"title": "t"}, headers=headers)
+    task_id = created.json()["id"]
+    etag = client.get(f"/api/tasks/tasks/{task_id}", headers=headers).headers["etag"]
+
+    first = client.put(f"/api/tasks/tasks/{task_id}", json={"title": "a"}, headers={**headers, "If-Match": etag})
+    assert first.status_code == 200
+    assert first.headers["etag"] == '"2"'
+
+    second = client.put(f"/api/tasks/tasks/{task_id}", json={"title": "b"}, headers={**headers, "If-Match": etag})
+    assert second.status_code == 412
+    assert second.headers["etag"] == '"2"'
+    assert client.get(f"/api/tasks/tasks/{task_id}", headers=headers).json()["title"] == "a"
+
+
+def test_import_with_invalid_row_imports_nothing(client, headers, monkeypatch):
+    monkeypatch.setattr(routes.tasks, "IMPORT_BATCH_SIZE", 2)
+    body = b'{"title": "a"}\n{"title": "b"}\n{"title": "c"}\n{"title": ""}\n'
+    ndjson = {**headers, "Content-Type": "application/x-ndjson"}
+
+    response = client.post("/api/tasks/import", content=body, headers=ndjson)
+    assert response.status_code == 422
+    assert client.get("/api/tasks/tasks", headers=headers).json() == []
+
+    fixed = client.post("/api/tasks/import", content=body.replace(b'""', b'"d"'), headers=ndjson)
+    assert fixed.json()["imported"] == 4
+    assert len(client.get("/api/tasks/tasks", headers=headers).json()) == 4
+
+
+def test_lookup_reports_other_users_tasks_as_forbidden(client, headers):
+    other = client.post("/api/auth/signup", data={"username": "other@example.com", "password": "secret"}).json()
+    other_headers = {"Authorization": f"Bearer {other['access_token']}"}
+    mine = client.post("/api/tasks/tasks", json={"title": "mine"}, headers=headers).json()["id"]
+    theirs = client.post("/api/tasks/tasks", json={"title": "theirs"}, headers=other_headers).json()["id"]
+
+    result = client.post("/api/tasks/tasks/lookup", json={"ids": [theirs, mine, 999]}, headers=headers).json()
+    assert [task["id"] for task in result["tasks"]] == [mine]
+    assert result["forbidden"] == [theirs]
+    assert result["not_found"] == [999]